@@ -4,7 +4,8 @@
 import sqlite3
 import os
 import logging
-from typing import Optional, Tuple, List
+import threading
+from typing import Dict, Optional, Tuple, List
 from .utils import get_config
 
 # Set up logging
@@ -13,6 +14,90 @@ logger = logging.getLogger(__name__)
 # Load config once at module level
 _CONFIG = get_config()
 
+# In-memory mirror of today's usage counters so the per-request rate check is
+# an O(1) dict lookup instead of a SELECT. SQLite stays authoritative: the
+# cache is rehydrated from the usage table with one query per database per day
+# (lazily, on the first check), and increment_usage updates both. Direct DB
+# writes that bypass increment_usage are picked up at the next rehydration;
+# tests can force one with _reset_usage_cache().
+_usage_cache: Dict[Tuple[str, str], int] = {}  # (db_path, username) -> count
+_usage_cache_day: Dict[str, str] = {}  # db_path -> date the cache was hydrated for
+_usage_cache_lock = threading.Lock()
+
+
+def _reset_usage_cache() -> None:
+    """Drop all cached usage counters (next check rehydrates from SQLite)."""
+    with _usage_cache_lock:
+        _usage_cache.clear()
+        _usage_cache_day.clear()
+
+
+def _rehydrate_usage_cache(db_path: str, today: str) -> None:
+    """Refill today's counters for db_path with a single SELECT."""
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            'SELECT username, request_count FROM usage WHERE date = ?',
+            (today,)
+        ).fetchall()
+
+    with _usage_cache_lock:
+        # Discard any counters from a previous day for this database
+        for key in [k for k in _usage_cache if k[0] == db_path]:
+            del _usage_cache[key]
+        for username, count in rows:
+            _usage_cache[(db_path, username)] = count
+        _usage_cache_day[db_path] = today
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite connection, honoring URI-style paths.
+
+    Paths starting with 'file:' (e.g. shared-memory databases like
+    'file:name?mode=memory&cache=shared') require uri=True.
+    """
+    return sqlite3.connect(db_path, uri=db_path.startswith('file:'))
+
+
+# Per-thread connection cache for the hot usage write path. Opening SQLite
+# costs a file stat + schema load per call; one connection per (thread, path)
+# amortizes that. Connections are opened in autocommit mode so each statement
+# is durable without an explicit commit.
+_conn_cache = threading.local()
+
+
+def _cached_connect(db_path: str) -> sqlite3.Connection:
+    """Return this thread's cached connection for db_path, opening on first use."""
+    cache = getattr(_conn_cache, 'conns', None)
+    if cache is None:
+        cache = _conn_cache.conns = {}
+    conn = cache.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(
+            db_path,
+            uri=db_path.startswith('file:'),
+            isolation_level=None,  # autocommit
+        )
+        cache[db_path] = conn
+    return conn
+
+
+def _close_cached_connections() -> None:
+    """Close and drop this thread's cached connections (used by tests)."""
+    cache = getattr(_conn_cache, 'conns', None)
+    if cache:
+        for conn in cache.values():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        cache.clear()
+
+
+def _is_uri_path(db_path: str) -> bool:
+    """Return True for SQLite URI-style paths (no filesystem directory to create)."""
+    return db_path.startswith('file:')
+
 
 def get_user_db_path() -> str:
     """
@@ -28,19 +113,34 @@ def get_user_db_path() -> str:
     return _CONFIG['database']['user_db_path']
 
 
+# User databases whose schema this process has already ensured. Keyed by path
+# because tests repoint get_user_db_path at per-test databases; the memo only
+# skips the CREATE TABLE round trip for paths that were set up before.
+_initialized_user_dbs: set = set()
+
+
+def _reset_user_db_memo() -> None:
+    """Forget which user databases were initialized (used by tests)."""
+    _initialized_user_dbs.clear()
+
+
 def init_user_db() -> None:
     """
     Initialize the user database with required tables.
     This is typically called by the external user management system,
     but we include it for testing purposes.
+    Re-initializing an already-set-up database path is a no-op.
     """
     db_path = get_user_db_path()
-    
+    if db_path in _initialized_user_dbs:
+        return
+
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Ensure directory exists (URI-style paths have no directory)
+        if not _is_uri_path(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        with sqlite3.connect(db_path) as conn:
+        with _connect(db_path) as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,7 +150,9 @@ def init_user_db() -> None:
                 )
             ''')
             conn.commit()
-            
+
+        _initialized_user_dbs.add(db_path)
+
     except sqlite3.Error as e:
         logger.error(f"Failed to initialize user database at {db_path}: {e}")
         raise
@@ -75,7 +177,7 @@ def verify_user_token(token: str) -> Optional[Tuple[str, str]]:
     db_path = get_user_db_path()
     
     try:
-        with sqlite3.connect(db_path) as conn:
+        with _connect(db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT username FROM users WHERE token = ?', (token,))
             result = cursor.fetchone()
@@ -114,9 +216,13 @@ def add_test_user(username: str, token: str) -> bool:
     db_path = get_user_db_path()
     
     try:
-        with sqlite3.connect(db_path) as conn:
-            conn.execute('INSERT OR REPLACE INTO users (username, token) VALUES (?, ?)', 
-                        (username, token))
+        with _connect(db_path) as conn:
+            # Upsert instead of INSERT OR REPLACE: re-adding a user updates the
+            # token in place rather than deleting and re-inserting the row
+            conn.execute('''
+                INSERT INTO users (username, token) VALUES (?, ?)
+                ON CONFLICT(username) DO UPDATE SET token = excluded.token
+            ''', (username, token))
             conn.commit()
             return True
     except sqlite3.Error as e:
@@ -152,10 +258,11 @@ def init_usage_db(db_path: Optional[str] = None) -> None:
         db_path = get_usage_db_path()
     
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Ensure directory exists (URI-style paths have no directory)
+        if not _is_uri_path(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        with sqlite3.connect(db_path) as conn:
+        with _connect(db_path) as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS usage (
                     username TEXT NOT NULL,
@@ -190,16 +297,24 @@ def increment_usage(username: str, db_path: Optional[str] = None) -> None:
     today = date.today().isoformat()
     
     try:
-        with sqlite3.connect(db_path) as conn:
-            # Use INSERT OR REPLACE to handle both new entries and updates
-            conn.execute('''
-                INSERT INTO usage (username, date, request_count)
-                VALUES (?, ?, 1)
-                ON CONFLICT(username, date) 
-                DO UPDATE SET request_count = request_count + 1
-            ''', (username, today))
-            conn.commit()
-            
+        # Thread-local cached connection in autocommit mode: no per-call
+        # sqlite open and no explicit commit needed
+        conn = _cached_connect(db_path)
+        conn.execute('''
+            INSERT INTO usage (username, date, request_count)
+            VALUES (?, ?, 1)
+            ON CONFLICT(username, date)
+            DO UPDATE SET request_count = request_count + 1
+        ''', (username, today))
+
+        # Mirror the write in the in-memory counters, but only when the cache
+        # is already hydrated for today - otherwise the next check_rate_limit
+        # rehydrates from SQLite and sees this write anyway
+        with _usage_cache_lock:
+            if _usage_cache_day.get(db_path) == today:
+                key = (db_path, username)
+                _usage_cache[key] = _usage_cache.get(key, 0) + 1
+
     except sqlite3.Error as e:
         logger.error(f"Failed to increment usage for user {username}: {e}")
         raise
@@ -227,21 +342,21 @@ def check_rate_limit(username: str, db_path: Optional[str] = None) -> Tuple[bool
     from datetime import date
     today = date.today().isoformat()
     daily_limit = _CONFIG.get('rate_limit', {}).get('daily_requests', 1000)
-    
+
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT request_count FROM usage 
-                WHERE username = ? AND date = ?
-            ''', (username, today))
-            result = cursor.fetchone()
-            
-            current_usage = result[0] if result else 0
-            is_within_limit = current_usage < daily_limit
-            
-            return is_within_limit, current_usage
-            
+        # Serve from the in-memory counters when hydrated for today;
+        # otherwise pay one SELECT to rehydrate (startup or day rollover)
+        with _usage_cache_lock:
+            hydrated = _usage_cache_day.get(db_path) == today
+        if not hydrated:
+            _rehydrate_usage_cache(db_path, today)
+
+        with _usage_cache_lock:
+            current_usage = _usage_cache.get((db_path, username), 0)
+        is_within_limit = current_usage < daily_limit
+
+        return is_within_limit, current_usage
+
     except sqlite3.Error as e:
         logger.error(f"Failed to check rate limit for user {username}: {e}")
         # In case of database error, allow the request (fail open)
@@ -271,7 +386,7 @@ def is_system_degraded(db_path: Optional[str] = None) -> bool:
     daily_limit = _CONFIG.get('rate_limit', {}).get('daily_requests', 1000)
     
     try:
-        with sqlite3.connect(db_path) as conn:
+        with _connect(db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT COUNT(*) FROM usage 
@@ -312,7 +427,7 @@ def get_degraded_users(db_path: Optional[str] = None) -> List[str]:
     daily_limit = _CONFIG.get('rate_limit', {}).get('daily_requests', 1000)
     
     try:
-        with sqlite3.connect(db_path) as conn:
+        with _connect(db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT username FROM usage 
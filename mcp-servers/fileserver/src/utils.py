@@ -1,6 +1,9 @@
 # ABOUT-ME: Utility functions and configuration management
 # ABOUT-ME: Loads base config.yaml and merges optional override YAML files
 
+import functools
+import json
+import tempfile
 import yaml
 import os
 from pathlib import Path
@@ -21,17 +24,52 @@ def _deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any
     return base
 
 
+def _load_yaml_cached(path: Path) -> Dict[str, Any]:
+    """Load a YAML file through a JSON sidecar cache keyed on the YAML mtime.
+
+    json.loads is an order of magnitude faster than yaml.safe_load, so after
+    the first parse each new process only pays JSON cost. The sidecar write is
+    best-effort (atomic via os.replace) and the YAML stays authoritative.
+    """
+    sidecar = path.with_suffix(path.suffix + ".json")
+    try:
+        if sidecar.stat().st_mtime >= path.stat().st_mtime:
+            with open(sidecar, "r") as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    with open(path, "r") as f:
+        data = yaml.safe_load(f) or {}
+
+    try:
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".json.tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, sidecar)
+    except (OSError, TypeError):
+        # Cache write failures (read-only dir, non-JSON-serializable values)
+        # are non-fatal; the YAML parse result is still returned
+        pass
+
+    return data
+
+
+@functools.lru_cache(maxsize=1)
 def get_config() -> Dict[str, Any]:
     """Load configuration from YAML with optional override file.
     Precedence: CONFIG_OVERRIDE file path > config.local.yaml (if present) > base config.yaml.
+
+    The parsed config is cached for the life of the process (YAML parsing is
+    the dominant cost); call get_config.cache_clear() to force a re-read.
+    Callers must not mutate the returned dict - deepcopy it first.
     """
     # Paths
     base_dir = Path(__file__).parent
     config_path = base_dir / "config.yaml"
 
     # Load base configuration
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f) or {}
+    config = _load_yaml_cached(config_path)
 
     # Determine override file
     override_path_str = os.environ.get("CONFIG_OVERRIDE")
@@ -45,8 +83,7 @@ def get_config() -> Dict[str, Any]:
 
     # Merge override if present
     if override_path and override_path.exists():
-        with open(override_path, "r") as f:
-            override_cfg = yaml.safe_load(f) or {}
+        override_cfg = _load_yaml_cached(override_path)
         if isinstance(override_cfg, dict):
             _deep_merge(config, override_cfg)
 
@@ -4,11 +4,33 @@
 import warnings
 import pytest
 import os
+import sqlite3
+import ssl
+import subprocess
 import sys
 from datetime import datetime, timezone
+from typing import TypedDict
 import asyncio
 
 
+# Use uvloop for the test event loops when available - its C selectors and
+# transports noticeably cut per-request overhead in the SSE integration tests
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+
+class SslConfig(TypedDict):
+    """Expected shape of the ssl section in config.yaml."""
+    enabled: bool
+    certfile: str
+    keyfile: str
+    ssl_version: int
+
+
 def pytest_configure(config):
     """Configure pytest to filter out specific third-party warnings"""
     
@@ -54,6 +76,199 @@ def pytest_runtest_logfinish(nodeid, location):  # type: ignore[override]
         _current_test["nodeid"] = None
 
 
+@pytest.fixture(scope="session")
+def ssl_certs(tmp_path_factory):
+    """Session-scoped self-signed certificates generated via generate-ssl-certs.sh.
+
+    Generating once per session replaces both the per-test generation cost and
+    the hidden dependency on a pre-existing ssl/ directory in the repo root.
+    Returns (cert_path, key_path); skips if generation isn't possible.
+    """
+    script_path = os.path.join(os.path.dirname(__file__), "..", "generate-ssl-certs.sh")
+    if not os.path.exists(script_path):
+        pytest.skip("Certificate generation script not found")
+
+    out_dir = tmp_path_factory.mktemp("ssl-certs")
+    try:
+        result = subprocess.run([
+            "bash", script_path
+        ], cwd=out_dir, capture_output=True, text=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        pytest.skip("Certificate generation timed out")
+    except FileNotFoundError:
+        pytest.skip("OpenSSL not available")
+
+    if result.returncode != 0:
+        pytest.skip(f"Certificate generation failed: {result.stderr}")
+
+    cert_file = out_dir / "ssl" / "server.crt"
+    key_file = out_dir / "ssl" / "server.key"
+    if not (cert_file.exists() and key_file.exists()):
+        pytest.skip("Certificate generation did not produce cert/key files")
+
+    return str(cert_file), str(key_file)
+
+
+@pytest.fixture(scope="session")
+def ssl_server_context(ssl_certs):
+    """Session-scoped server-side SSLContext loaded with the test certificates.
+
+    Building an SSLContext parses the root certificate store, which is
+    relatively expensive; one context per session is enough since the tests
+    only inspect it.
+    """
+    cert_file, key_file = ssl_certs
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+@pytest.fixture(scope="session")
+def validated_config():
+    """Loaded config with its ssl section schema-checked once per session.
+
+    The key/isinstance checks are driven by the SslConfig TypedDict
+    annotations, so structure tests just consume the fixture instead of
+    re-running their own per-key loops.
+    """
+    from src.utils import get_config
+
+    config = get_config()
+    assert "ssl" in config, "Missing config section: ssl"
+    ssl_config = config["ssl"]
+
+    for key, expected_type in SslConfig.__annotations__.items():
+        assert key in ssl_config, f"Missing SSL config key: {key}"
+        assert isinstance(ssl_config[key], expected_type), (
+            f"SSL config key {key} should be {expected_type.__name__}, "
+            f"got {type(ssl_config[key]).__name__}"
+        )
+
+    return config
+
+
+@pytest.fixture(scope="session")
+def mcp_app():
+    """Session-scoped ASGI app built once from the MCP server.
+
+    mcp.sse_app() mounts the Starlette routes on every call; tests that only
+    inspect the app share one instance. Tests that mutate the app (e.g. by
+    adding middleware) must keep building their own.
+    """
+    from src.server import mcp
+
+    return mcp.sse_app()
+
+
+@pytest.fixture(scope="session")
+def health_check_result():
+    """Result of one health_check tool call, shared for the session.
+
+    The call is deterministic for fixed inputs, so tests asserting on its
+    shape reuse a single invocation (run on a private loop - the per-test
+    event_loop fixture is function-scoped).
+    """
+    from src.server import mcp
+
+    return asyncio.run(mcp.call_tool("health_check", {}))
+
+
+@pytest.fixture(scope="session")
+def registered_tools():
+    """Tool list from one mcp.list_tools() call, shared for the session."""
+    from src.server import mcp
+
+    return asyncio.run(mcp.list_tools())
+
+
+@pytest.fixture(scope="session")
+def cert_properties(ssl_certs):
+    """Parse the session certificate once and expose its derived properties.
+
+    Every security/extraction test asserts against this dict instead of
+    re-reading and re-parsing the PEM; the SHA-256 fingerprint keys the
+    parse to the exact cert bytes (useful for xdist worker caches too).
+    """
+    import hashlib
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    cert_file, _ = ssl_certs
+    with open(cert_file, "rb") as f:
+        data = f.read()
+    cert = x509.load_pem_x509_certificate(data)
+
+    public_key = cert.public_key()
+    # not_valid_*_utc appeared in cryptography 42; fall back for older versions
+    not_before = getattr(cert, "not_valid_before_utc", None) or cert.not_valid_before
+    not_after = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+
+    return {
+        "fingerprint": hashlib.sha256(data).hexdigest(),
+        "subject": cert.subject.rfc4514_string(),
+        "issuer": cert.issuer.rfc4514_string(),
+        "key_size": public_key.key_size if isinstance(public_key, rsa.RSAPublicKey) else None,
+        "is_self_signed": cert.subject == cert.issuer,
+        "not_before": not_before,
+        "not_after": not_after,
+    }
+
+
+@pytest.fixture(scope="session")
+def openssl_cert_text():
+    """Return a callable yielding cached `openssl x509 -text -noout` output.
+
+    Several tests inspect the same certificate file; caching the subprocess
+    stdout (keyed on path + mtime) means one fork/exec per cert instead of one
+    per assertion group.
+    """
+    cache = {}
+
+    def _text(cert_file):
+        key = (cert_file, os.path.getmtime(cert_file))
+        if key not in cache:
+            result = subprocess.run([
+                "openssl", "x509", "-in", cert_file, "-text", "-noout"
+            ], capture_output=True, text=True, check=True)
+            cache[key] = result.stdout
+        return cache[key]
+
+    return _text
+
+
+@pytest.fixture(scope="session")
+def test_database():
+    """Session-scoped in-memory users database with the standard test users.
+
+    A shared-cache memory URI keeps the database entirely in RAM (no
+    create/fsync/unlink syscalls) while still letting src.db open its own
+    connections to it by path. The anchor connection held open here keeps the
+    in-memory database alive for the whole session.
+    """
+    db_uri = "file:conftest_users?mode=memory&cache=shared"
+
+    anchor = sqlite3.connect(db_uri, uri=True)
+    try:
+        cursor = anchor.cursor()
+        cursor.execute('''
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                token TEXT UNIQUE NOT NULL,
+                role TEXT NOT NULL
+            )
+        ''')
+        cursor.executemany("INSERT INTO users (username, token, role) VALUES (?, ?, ?)", [
+            ("testuser", "test-token-123", "user"),
+            ("testadmin", "admin-token-456", "admin"),
+        ])
+        anchor.commit()
+
+        yield db_uri
+    finally:
+        anchor.close()
+
+
 # Ensure each test gets a clean, fully-closed event loop to avoid teardown warnings
 @pytest.fixture(scope="function")
 def event_loop():
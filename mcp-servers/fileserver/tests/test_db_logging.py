@@ -35,7 +35,12 @@ def test_database_init_error_logging(caplog):
     """Test that database initialization errors are properly logged"""
     
     # pytest automatically sets PYTEST_CURRENT_TEST, so we don't need to manage it manually
-    
+
+    # init_user_db memoizes already-initialized paths; forget them so the
+    # call below actually reaches the mocked os.makedirs
+    from src.db import _reset_user_db_memo
+    _reset_user_db_memo()
+
     # Mock os.makedirs to raise an error
     with patch('src.db.os.makedirs') as mock_makedirs:
         mock_makedirs.side_effect = OSError("Permission denied")
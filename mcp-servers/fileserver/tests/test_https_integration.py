@@ -2,6 +2,7 @@
 # ABOUT-ME: Tests actual HTTPS server startup and communication with generated certificates
 
 import pytest
+import copy
 import os
 import tempfile
 import yaml
@@ -345,7 +346,9 @@ class TestHTTPSConfigurationSwitching:
         
         # Create HTTPS config
         with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            https_config = http_config.copy()
+            # Deepcopy - get_config returns a cached dict and the nested ssl
+            # section is mutated below
+            https_config = copy.deepcopy(http_config)
             https_config["ssl"]["enabled"] = True
             https_config["ssl"]["certfile"] = "ssl/server.crt"
             https_config["ssl"]["keyfile"] = "ssl/server.key"
@@ -368,21 +371,20 @@ class TestHTTPSConfigurationSwitching:
         finally:
             os.unlink(temp_config_path)
     
-    def test_ssl_certificate_paths_validation(self):
+    def test_ssl_certificate_paths_validation(self, ssl_certs):
         """Test validation of SSL certificate paths"""
-        # Test with valid certificate paths (from generated certs)
-        if os.path.exists("ssl/server.crt") and os.path.exists("ssl/server.key"):
-            # Verify certificates exist and are readable
-            assert os.path.isfile("ssl/server.crt")
-            assert os.path.isfile("ssl/server.key")
-            
-            # Verify certificates are not empty
-            assert os.path.getsize("ssl/server.crt") > 0
-            assert os.path.getsize("ssl/server.key") > 0
-            
-            print("SSL certificate paths validation passed")
-        else:
-            pytest.skip("Generated SSL certificates not found")
+        # Test with valid certificate paths (from the session-generated certs)
+        cert_file, key_file = ssl_certs
+
+        # Verify certificates exist and are readable
+        assert os.path.isfile(cert_file)
+        assert os.path.isfile(key_file)
+
+        # Verify certificates are not empty
+        assert os.path.getsize(cert_file) > 0
+        assert os.path.getsize(key_file) > 0
+
+        print("SSL certificate paths validation passed")
 
 
 if __name__ == "__main__":
@@ -3,38 +3,31 @@
 
 import pytest
 import asyncio
+import copy
 import json
-import tempfile
 import subprocess
 import os
-import sqlite3
+import re
 from unittest.mock import patch, MagicMock
-from src.server import mcp
 from src.utils import get_config
-from src.auth import verify_token
-from src.db import verify_user_token
+
+# src.server (FastMCP/uvicorn/starlette) and the auth/db modules are imported
+# inside the tests that need them so collection of -k subsets stays cheap
+
+# Minimum acceptable bearer-token shape: 10+ chars containing a letter and a digit
+TOKEN_RE = re.compile(r'^(?=.{10,})(?=.*[A-Za-z])(?=.*\d).*$')
 
 
 class TestMCPServerConfiguration:
     """Test MCP server configuration and setup for HTTPS"""
     
-    def test_https_configuration_loading(self):
+    def test_https_configuration_loading(self, validated_config):
         """Test that HTTPS configuration is properly loaded"""
-        config = get_config()
-        
-        # Verify SSL configuration structure
-        assert "ssl" in config
-        ssl_config = config["ssl"]
-        
-        required_keys = ["enabled", "certfile", "keyfile", "ssl_version"]
-        for key in required_keys:
-            assert key in ssl_config
-        
-        # Test configuration values are reasonable
-        assert isinstance(ssl_config["enabled"], bool)
-        assert isinstance(ssl_config["ssl_version"], int)
+        # Structure and types are checked once by the session-scoped
+        # validated_config fixture; only value-level checks remain here
+        ssl_config = validated_config["ssl"]
         assert ssl_config["ssl_version"] in [17]  # Valid modern SSL version
-        
+
         print(f"✅ HTTPS configuration loaded: {ssl_config}")
     
     def test_server_config_for_https(self):
@@ -55,57 +48,24 @@ class TestMCPServerConfiguration:
         
         print(f"✅ Server config supports HTTPS: {server_config}")
     
-    def test_mcp_app_creation(self):
+    def test_mcp_app_creation(self, mcp_app):
         """Test that MCP FastAPI app can be created (needed for HTTPS server)"""
-        app = mcp.sse_app()
-        
-        # Verify app is created and has expected attributes
-        assert app is not None
-        assert hasattr(app, 'router') or hasattr(app, 'routes')
-        
+        # Verify the session-built app has expected attributes
+        assert mcp_app is not None
+        assert hasattr(mcp_app, 'router') or hasattr(mcp_app, 'routes')
+
         print("✅ MCP FastAPI app created successfully")
 
 
 class TestAuthenticationIntegration:
     """Test authentication and authorization for HTTPS requests"""
-    
-    @pytest.fixture
-    def test_database(self):
-        """Create test database with users"""
-        with tempfile.NamedTemporaryFile(delete=False) as temp_db:
-            temp_db_path = temp_db.name
-        
-        try:
-            conn = sqlite3.connect(temp_db_path)
-            cursor = conn.cursor()
-            
-            # Create users table
-            cursor.execute('''
-                CREATE TABLE users (
-                    id INTEGER PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    token TEXT UNIQUE NOT NULL,
-                    role TEXT NOT NULL
-                )
-            ''')
-            
-            # Insert test users
-            cursor.execute("INSERT INTO users (username, token, role) VALUES (?, ?, ?)",
-                          ("testuser", "test-token-123", "user"))
-            cursor.execute("INSERT INTO users (username, token, role) VALUES (?, ?, ?)",
-                          ("testadmin", "admin-token-456", "admin"))
-            conn.commit()
-            conn.close()
-            
-            yield temp_db_path
-            
-        finally:
-            # Clean up
-            if os.path.exists(temp_db_path):
-                os.unlink(temp_db_path)
-    
+
+    # Uses the session-scoped test_database fixture from conftest.py
+
     def test_bearer_token_verification(self, test_database):
         """Test bearer token verification that would be used in HTTPS requests"""
+        from src.db import verify_user_token
+
         # Mock the database configuration and path function
         test_config = {
             "database": {"user_db_path": test_database},
@@ -138,6 +98,8 @@ class TestAuthenticationIntegration:
     
     def test_auth_module_integration(self, test_database):
         """Test auth module integration with database"""
+        from src.auth import verify_token
+
         test_config = {
             "database": {"user_db_path": test_database},
             "admin_users": ["testadmin"]
@@ -159,78 +121,71 @@ class TestMCPToolIntegration:
     """Test MCP tools that would be called via HTTPS"""
     
     @pytest.mark.asyncio
-    async def test_health_check_tool_direct(self):
-        """Test health check tool directly (simulates HTTPS request)"""
-        result = await mcp.call_tool("health_check", {})
-        
-        assert len(result) == 1
-        assert result[0].type == "text"
-        
-        response_data = json.loads(result[0].text)
+    async def test_mcp_tools_batched(self, tmp_path):
+        """Test health_check, list_directory, and create_file tools concurrently
+        under a single event loop (simulates HTTPS requests)"""
+        from src.server import mcp
+
+        temp_dir = str(tmp_path)
+        # Create test file for list_directory
+        test_file = os.path.join(temp_dir, "test.txt")
+        with open(test_file, 'w') as f:
+            f.write("test content")
+        new_file_path = os.path.join(temp_dir, "new_file.txt")
+
+        # Mock configuration for allowed directories (deepcopy - get_config
+        # returns a cached dict that must not be mutated)
+        test_config = copy.deepcopy(get_config())
+        test_config["allowed_directories"] = [temp_dir]
+
+        with patch('src.utils.get_config', return_value=test_config):
+            # The three calls are independent - issue them concurrently so
+            # one event loop serves all of them
+            health_result, list_result, create_result = await asyncio.gather(
+                mcp.call_tool("health_check", {}),
+                mcp.call_tool("list_directory", {"path": temp_dir}),
+                mcp.call_tool("create_file", {
+                    "path": new_file_path,
+                    "content": "Created via MCP tool!"
+                }),
+                return_exceptions=True,
+            )
+
+        # Health check must always work
+        assert not isinstance(health_result, Exception)
+        assert len(health_result) == 1
+        assert health_result[0].type == "text"
+        response_data = json.loads(health_result[0].text)
         assert response_data == {"status": "ok"}
-        
         print("✅ Health check tool working (HTTPS-ready)")
-    
-    @pytest.mark.asyncio
-    async def test_list_directory_tool_direct(self):
-        """Test list_directory tool directly (simulates HTTPS request)"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create test file
-            test_file = os.path.join(temp_dir, "test.txt")
-            with open(test_file, 'w') as f:
-                f.write("test content")
-            
-            # Mock configuration for allowed directories
-            test_config = get_config()
-            test_config["allowed_directories"] = [temp_dir]
-            
-            with patch('src.utils.get_config', return_value=test_config):
-                try:
-                    result = await mcp.call_tool("list_directory", {"path": temp_dir})
-                    
-                    assert len(result) >= 1
-                    assert result[0].type == "text"
-                    
-                    response_data = json.loads(result[0].text)
-                    assert "files" in response_data or "items" in response_data
-                    
-                    print("✅ List directory tool working (HTTPS-ready)")
-                    
-                except Exception as e:
-                    # Tool might not be fully implemented yet
-                    print(f"ℹ️ List directory tool: {e}")
-    
-    @pytest.mark.asyncio
-    async def test_create_file_tool_direct(self):
-        """Test create_file tool directly (simulates HTTPS request)"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            test_file_path = os.path.join(temp_dir, "new_file.txt")
-            
-            # Mock configuration
-            test_config = get_config()
-            test_config["allowed_directories"] = [temp_dir]
-            
-            with patch('src.utils.get_config', return_value=test_config):
-                try:
-                    result = await mcp.call_tool("create_file", {
-                        "path": test_file_path,
-                        "content": "Created via MCP tool!"
-                    })
-                    
-                    assert len(result) >= 1
-                    assert result[0].type == "text"
-                    
-                    # Verify file was created
-                    if os.path.exists(test_file_path):
-                        with open(test_file_path, 'r') as f:
-                            content = f.read()
-                        assert "Created via MCP tool!" in content
-                        
-                    print("✅ Create file tool working (HTTPS-ready)")
-                    
-                except Exception as e:
-                    # Tool might not be fully implemented yet
-                    print(f"ℹ️ Create file tool: {e}")
+
+        # list_directory / create_file might not be fully implemented yet,
+        # so (as before) report rather than fail on their problems
+        try:
+            if isinstance(list_result, Exception):
+                raise list_result
+            assert len(list_result) >= 1
+            assert list_result[0].type == "text"
+            response_data = json.loads(list_result[0].text)
+            assert "files" in response_data or "items" in response_data
+            print("✅ List directory tool working (HTTPS-ready)")
+        except Exception as e:
+            print(f"ℹ️ List directory tool: {e}")
+
+        try:
+            if isinstance(create_result, Exception):
+                raise create_result
+            assert len(create_result) >= 1
+            assert create_result[0].type == "text"
+
+            # Verify file was created
+            if os.path.exists(new_file_path):
+                with open(new_file_path, 'r') as f:
+                    content = f.read()
+                assert "Created via MCP tool!" in content
+            print("✅ Create file tool working (HTTPS-ready)")
+        except Exception as e:
+            print(f"ℹ️ Create file tool: {e}")
 
 
 class TestHTTPSSecurityFeatures:
@@ -275,18 +230,15 @@ class TestHTTPSSecurityFeatures:
         
         print("✅ HTTPS configuration validation working")
     
-    def test_bearer_token_security_design(self):
+    @pytest.mark.parametrize("token", [
+        "test-token-123", "admin-token-456", "prod-token-xyz789"
+    ])
+    def test_bearer_token_security_design(self, token):
         """Test that bearer tokens are designed for secure transmission"""
-        # Test token format (should be non-trivial)
-        test_tokens = ["test-token-123", "admin-token-456", "prod-token-xyz789"]
-        
-        for token in test_tokens:
-            # Tokens should be reasonably long
-            assert len(token) >= 10
-            # Tokens should contain some variety
-            assert any(c.isalpha() for c in token)
-            assert any(c.isdigit() for c in token)
-            
+        # Token format should be non-trivial: at least 10 chars with both
+        # letters and digits, checked in one compiled-regex pass
+        assert TOKEN_RE.match(token), f"Token format too weak: {token}"
+
         print("✅ Bearer token format suitable for HTTPS transmission")
 
 
@@ -5,30 +5,23 @@ import pytest
 import asyncio
 import json
 import os
-import tempfile
 import sqlite3
-from src.server import mcp
 from src.utils import get_config
 
-@pytest.mark.asyncio
-async def test_health_check_tool():
-    """Test that health_check tool returns correct status"""
-    # Call the health_check tool directly
-    result = await mcp.call_tool("health_check", {})
-    
+def test_health_check(health_check_result):
+    """Test that health_check returns ok status"""
+    # The session fixture called the tool once; assert on the shared result
     # FastMCP returns a list of TextContent objects
-    assert len(result) == 1
-    assert result[0].type == "text"
-    
+    assert len(health_check_result) == 1
+    assert health_check_result[0].type == "text"
+
     # Parse the JSON text content
-    response_data = json.loads(result[0].text)
+    response_data = json.loads(health_check_result[0].text)
     assert response_data == {"status": "ok"}
 
-@pytest.mark.asyncio
-async def test_health_check_listed():
-    """Test that health_check tool is properly registered"""
-    tools = await mcp.list_tools()
-    tool_names = [tool.name for tool in tools]
+def test_health_check_registered(registered_tools):
+    """Test that the health_check tool is registered with the MCP server"""
+    tool_names = [tool.name for tool in registered_tools]
     assert "health_check" in tool_names
 
 def test_config_yaml_loading():
@@ -55,11 +48,13 @@ async def test_usage_tracking_increments():
     import sqlite3
     from src.db import init_usage_db, add_test_user
     from src.auth import verify_token
-    
-    # Create temporary usage database for testing
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_usage_db:
-        usage_db_path = temp_usage_db.name
-    
+
+    # Shared-memory URI keeps the usage DB entirely in RAM (no file
+    # create/fsync/unlink); the anchor connection keeps it alive while
+    # src.db opens its own connections against the same URI
+    usage_db_path = "file:usage_tracking_test?mode=memory&cache=shared"
+    anchor = sqlite3.connect(usage_db_path, uri=True)
+
     try:
         # Initialize usage database
         init_usage_db(usage_db_path)
@@ -74,62 +69,65 @@ async def test_usage_tracking_increments():
         
         # Simulate authenticated request by calling usage tracking directly
         from src.server import track_usage
-        
-        # First request
-        track_usage(username, usage_db_path)
-        
-        # Check usage was recorded
-        conn = sqlite3.connect(usage_db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT username, date, request_count 
-            FROM usage 
-            WHERE username = ?
-        """, (username,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        assert result is not None
-        assert result[0] == username  # username
-        assert result[2] == 1  # request_count
-        
-        # Second request
-        track_usage(username, usage_db_path)
-        
-        # Check usage was incremented
-        conn = sqlite3.connect(usage_db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT request_count 
-            FROM usage 
-            WHERE username = ?
-        """, (username,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        assert result[0] == 2  # request_count incremented
-        
+
+        # One verification connection for both assertions instead of an
+        # open/close cycle per re-read
+        verify_conn = sqlite3.connect(usage_db_path, uri=True)
+        try:
+            verify_conn.execute("PRAGMA read_uncommitted=1")
+
+            # First request
+            track_usage(username, usage_db_path)
+
+            # Check usage was recorded
+            result = verify_conn.execute("""
+                SELECT username, date, request_count
+                FROM usage
+                WHERE username = ?
+            """, (username,)).fetchone()
+
+            assert result is not None
+            assert result[0] == username  # username
+            assert result[2] == 1  # request_count
+
+            # Second request
+            track_usage(username, usage_db_path)
+
+            # Check usage was incremented
+            result = verify_conn.execute("""
+                SELECT request_count
+                FROM usage
+                WHERE username = ?
+            """, (username,)).fetchone()
+
+            assert result[0] == 2  # request_count incremented
+        finally:
+            verify_conn.close()
+
     finally:
-        # Clean up temporary database
-        if os.path.exists(usage_db_path):
-            os.unlink(usage_db_path)
+        # Release the cached write connection, then the anchor (the last
+        # connection out releases the in-memory database)
+        from src.db import _close_cached_connections
+        _close_cached_connections()
+        anchor.close()
 
 @pytest.mark.asyncio
 async def test_usage_database_isolation():
     """Test that usage.db is properly isolated for testing"""
     import sqlite3
     from src.db import init_usage_db
-    
-    # Create temporary usage database for testing
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_usage_db:
-        usage_db_path = temp_usage_db.name
-    
+
+    # In-memory database under its own URI name - isolated from every other
+    # test by construction, with no file to clean up afterwards
+    usage_db_path = "file:usage_isolation_test?mode=memory&cache=shared"
+    anchor = sqlite3.connect(usage_db_path, uri=True)
+
     try:
         # Initialize usage database
         init_usage_db(usage_db_path)
-        
+
         # Verify database was created and has expected structure
-        conn = sqlite3.connect(usage_db_path)
+        conn = sqlite3.connect(usage_db_path, uri=True)
         cursor = conn.cursor()
         
         # Check that usage table exists
@@ -151,15 +149,10 @@ async def test_usage_database_isolation():
             assert col in column_names
         
         conn.close()
-        
-    finally:
-        # Clean up temporary database
-        if os.path.exists(usage_db_path):
-            os.unlink(usage_db_path)
 
-def test_placeholder():
-    """Placeholder test that always passes"""
-    assert True
+    finally:
+        # Dropping the anchor releases the in-memory database
+        anchor.close()
 
 @pytest.mark.asyncio
 async def test_rate_limit_threshold_from_config():
@@ -183,10 +176,40 @@ async def test_rate_limit_threshold_from_config():
         
         # Default should be 1000 as per our config
         assert daily_limit == 1000
-        
-        # This test should pass as it only checks configuration
-        # The actual rate limiting logic will be tested in the above tests
-        
+
+        # The in-memory counter cache must mirror the usage table: counts
+        # written before hydration are picked up by the rehydrating SELECT,
+        # and counts written after hydration via the O(1) update path
+        from src.db import (
+            init_usage_db, increment_usage, check_rate_limit,
+            _reset_usage_cache, _close_cached_connections
+        )
+        usage_db_path = "file:rate_cache_test?mode=memory&cache=shared"
+        anchor = sqlite3.connect(usage_db_path, uri=True)
+        try:
+            init_usage_db(usage_db_path)
+            _reset_usage_cache()
+
+            increment_usage("cacheuser", usage_db_path)
+            increment_usage("cacheuser", usage_db_path)
+            ok, count = check_rate_limit("cacheuser", usage_db_path)
+            assert ok
+            assert count == 2
+
+            increment_usage("cacheuser", usage_db_path)
+            ok, count = check_rate_limit("cacheuser", usage_db_path)
+            assert count == 3
+
+            row = anchor.execute(
+                "SELECT request_count FROM usage WHERE username = ?",
+                ("cacheuser",)
+            ).fetchone()
+            assert row[0] == count
+        finally:
+            _close_cached_connections()
+            anchor.close()
+            _reset_usage_cache()
+
     finally:
         # Clean up test environment
         if 'PYTEST_CURRENT_TEST' in os.environ: